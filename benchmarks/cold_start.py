@@ -0,0 +1,77 @@
+"""
+Import-time and cold-start benchmark for claude_agent.
+
+Each sample runs in a fresh interpreter, like a serverless cold start:
+
+    python benchmarks/cold_start.py --runs 20
+
+Reported phases:
+- import: `import claude_agent`
+- construct: orchestrator with four workers and two tools
+- first_execute: first orchestrated task, including lazy initialization
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# Runs inside the child interpreter and prints phase timings in seconds
+PROBE = """
+import json, time
+start = time.perf_counter()
+import claude_agent as ca
+imported = time.perf_counter()
+
+orchestrator = ca.OrchestratorAgent()
+for name in ("analyzer", "designer", "coder", "tester"):
+    orchestrator.add_worker(name, ca.ClaudeAgent())
+orchestrator.add_tool(ca.create_file_search_tool())
+orchestrator.add_tool(ca.create_code_execution_tool())
+constructed = time.perf_counter()
+
+orchestrator.execute(ca.AgentTask(task_id="bench", description="cold start"))
+executed = time.perf_counter()
+orchestrator.close()
+
+print(json.dumps({
+    "import": imported - start,
+    "construct": constructed - imported,
+    "first_execute": executed - constructed,
+}))
+"""
+
+
+def run_once() -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        cwd=REPO_ROOT,
+        check=True,
+        capture_output=True,
+        text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10, help="Fresh interpreters to sample")
+    args = parser.parse_args()
+
+    samples = [run_once() for _ in range(args.runs)]
+
+    print(f"{'phase':<15}{'median ms':>12}{'min ms':>10}{'max ms':>10}")
+    for phase in ("import", "construct", "first_execute"):
+        values = [sample[phase] * 1000 for sample in samples]
+        print(
+            f"{phase:<15}{statistics.median(values):>12.2f}"
+            f"{min(values):>10.2f}{max(values):>10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -9,19 +9,93 @@ Based on Anthropic's best practices for building effective agents.
 
 import json
 import logging
-from datetime import datetime
-from typing import Any, Dict, List, Optional, Callable
+import queue
+import struct
+import sys
+import threading
+from collections import OrderedDict, deque
+from types import MappingProxyType
+from typing import (
+    TYPE_CHECKING, Any, Deque, Dict, Iterable, Iterator, List, Mapping, Optional,
+    Callable, TextIO, Tuple, Union
+)
 from enum import Enum
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, replace
 import time
 
+# hashlib, concurrent.futures, sqlite3 and anthropic are imported where
+# they are used, so importing this module stays cheap for cold starts
+if TYPE_CHECKING:
+    from concurrent.futures import ThreadPoolExecutor
+
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+def configure_logging(level: int = logging.INFO) -> None:
+    """Configure console logging; call once from an application entry point"""
+    logging.basicConfig(
+        level=level,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+
+class ResourceRegistry:
+    """
+    Process-wide cache of expensive shared resources.
+
+    Model backends, search indexes and sandbox pools are built by their
+    factory on first use and then shared, so agents that need the same
+    resource reuse one instance. Each resource is built at most once,
+    without holding up lookups of other resources while it builds.
+    """
+
+    def __init__(self):
+        self._resources: Dict[Tuple[str, Any], Any] = {}
+        self._building: Dict[Tuple[str, Any], threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def get(self, kind: str, key: Any, factory: Callable[[], Any]) -> Any:
+        """Return the `kind` resource for `key`, building it if needed"""
+        slot = (kind, key)
+        with self._lock:
+            if slot in self._resources:
+                return self._resources[slot]
+            build_lock = self._building.setdefault(slot, threading.Lock())
+
+        with build_lock:
+            with self._lock:
+                if slot in self._resources:
+                    return self._resources[slot]
+
+            logger.info("Initializing %s resource", kind)
+            resource = factory()
+
+            with self._lock:
+                self._resources[slot] = resource
+                self._building.pop(slot, None)
+            return resource
+
+    def is_initialized(self, kind: str, key: Any) -> bool:
+        with self._lock:
+            return (kind, key) in self._resources
+
+    def clear(self, kind: Optional[str] = None) -> None:
+        """Drop cached resources, all of them or only those of `kind`"""
+        with self._lock:
+            for slot in [s for s in self._resources if kind is None or s[0] == kind]:
+                del self._resources[slot]
+
+
+resources = ResourceRegistry()
+
+
+def create_anthropic_backend(api_key: Optional[str]) -> Any:
+    """Default backend factory: an Anthropic API client"""
+    import anthropic
+
+    return anthropic.Anthropic(api_key=api_key)
 
 
 class AgentPattern(Enum):
@@ -42,6 +116,87 @@ class ThinkingMode(Enum):
     ULTRA = "ultrathink"
 
 
+class TaskCancelledError(Exception):
+    """Raised when work is attempted on a cancelled task"""
+
+
+class DeadlineExceededError(TaskCancelledError):
+    """Raised when a task runs past its deadline"""
+
+
+class SubtaskFailedError(Exception):
+    """Raised to a coalesced subtask when the shared execution raised"""
+
+
+class CancellationToken:
+    """
+    Cooperative cancellation signal with an optional deadline.
+
+    Tokens form a tree: a child is cancelled whenever its parent is, and
+    its deadline never extends past the parent's. Workers and tools are
+    expected to check the token between units of work.
+    """
+
+    def __init__(
+        self,
+        timeout: Optional[float] = None,
+        parent: Optional["CancellationToken"] = None
+    ):
+        self.parent = parent
+        self.reason: Optional[str] = None
+        self._event = threading.Event()
+
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        if parent is not None and parent.deadline is not None:
+            deadline = parent.deadline if deadline is None else min(deadline, parent.deadline)
+        self.deadline = deadline
+
+    @property
+    def expired(self) -> bool:
+        """Whether the deadline has passed"""
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            return True
+        return self.parent is not None and self.parent.expired
+
+    @property
+    def cancelled(self) -> bool:
+        """Whether the token was cancelled explicitly or by deadline"""
+        if self._event.is_set() or self.expired:
+            return True
+        return self.parent is not None and self.parent.cancelled
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        """Signal cancellation to everything holding this token"""
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left before the deadline, or None if unbounded"""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def child(self, timeout: Optional[float] = None) -> "CancellationToken":
+        """Create a token bounded by this one"""
+        return CancellationToken(timeout=timeout, parent=self)
+
+    def raise_if_cancelled(self) -> None:
+        """Raise if the token has been cancelled or has expired"""
+        if self.expired:
+            raise DeadlineExceededError("Deadline exceeded")
+        if self.cancelled:
+            raise TaskCancelledError(self._cancel_reason())
+
+    def _cancel_reason(self) -> str:
+        token: Optional[CancellationToken] = self
+        while token is not None:
+            if token.reason:
+                return token.reason
+            token = token.parent
+        return "cancelled"
+
+
 @dataclass
 class Tool:
     """
@@ -69,8 +224,37 @@ class Tool:
             }
         }
 
-    def execute(self, **kwargs) -> Any:
-        """Execute the tool function with validation"""
+    def execute(
+        self,
+        cancel_token: Optional[CancellationToken] = None,
+        **kwargs
+    ) -> Any:
+        """
+        Execute the tool function with validation.
+
+        If a cancellation token is given, the call is refused once the
+        token is cancelled, and any `timeout_seconds` argument is clamped
+        to the time remaining before the token's deadline. If less than
+        the parameter's declared minimum remains, the call is refused with
+        DeadlineExceededError instead.
+        """
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+            remaining = cancel_token.remaining()
+            if remaining is not None and "timeout_seconds" in self.parameters:
+                spec = self.parameters["timeout_seconds"]
+                requested = kwargs.get("timeout_seconds", spec.get("default", remaining))
+                timeout = min(requested, remaining)
+                if spec.get("type") == "integer":
+                    # Round down: rounding up would overrun the deadline
+                    timeout = int(timeout)
+                if timeout < spec.get("minimum", 0):
+                    raise DeadlineExceededError(
+                        f"Only {remaining:.3f}s left, below the minimum "
+                        f"timeout_seconds of {self.name}"
+                    )
+                kwargs["timeout_seconds"] = timeout
+
         try:
             logger.info(f"Executing tool: {self.name} with args: {kwargs}")
             result = self.function(**kwargs)
@@ -81,7 +265,124 @@ class Tool:
             raise
 
 
-@dataclass
+class Rope:
+    """
+    Immutable text made of shared string chunks.
+
+    Concatenating ropes reuses the existing chunks instead of copying
+    their contents, and `write_to` / `iter_bytes` stream chunk by chunk.
+    The flat `str` and the UTF-8 encoded chunks are only built on demand
+    (and then cached), so repeated streaming doesn't re-encode.
+    """
+
+    __slots__ = ("_chunks", "_length", "_flat", "_encoded")
+
+    def __init__(self, chunks: Iterable[Union[str, "Rope"]] = ()):
+        flat: List[str] = []
+        for chunk in chunks:
+            if isinstance(chunk, Rope):
+                flat.extend(chunk._chunks)
+            elif isinstance(chunk, str):
+                if chunk:
+                    flat.append(chunk)
+            else:
+                raise TypeError(
+                    f"Rope chunks must be str or Rope, not {type(chunk).__name__}"
+                )
+        self._chunks: Tuple[str, ...] = tuple(flat)
+        self._length = sum(len(chunk) for chunk in flat)
+        self._flat: Optional[str] = None
+        self._encoded: Optional[Tuple[bytes, ...]] = None
+
+    @classmethod
+    def join(cls, separator: str, parts: Iterable[Union[str, "Rope"]]) -> "Rope":
+        """Same result as `str.join`, without copying the parts"""
+        chunks: List[Union[str, Rope]] = []
+        for i, part in enumerate(parts):
+            if not isinstance(part, (str, Rope)):
+                raise TypeError(
+                    f"Rope parts must be str or Rope, not {type(part).__name__}"
+                )
+            if i:
+                chunks.append(separator)
+            chunks.append(part)
+        return cls(chunks)
+
+    @property
+    def chunks(self) -> Tuple[str, ...]:
+        return self._chunks
+
+    def iter_bytes(self) -> Iterator[memoryview]:
+        """UTF-8 encoded chunks, for streaming to sockets or files"""
+        if self._encoded is None:
+            self._encoded = tuple(chunk.encode("utf-8") for chunk in self._chunks)
+        for chunk in self._encoded:
+            yield memoryview(chunk)
+
+    def write_to(self, stream: TextIO) -> None:
+        """Write the rope to a text stream chunk by chunk"""
+        for chunk in self._chunks:
+            stream.write(chunk)
+
+    def __str__(self) -> str:
+        if self._flat is None:
+            self._flat = "".join(self._chunks)
+        return self._flat
+
+    def __repr__(self) -> str:
+        return f"Rope({len(self._chunks)} chunks, {self._length} chars)"
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._chunks)
+
+    def __add__(self, other: Union[str, "Rope"]) -> "Rope":
+        if isinstance(other, (str, Rope)):
+            return Rope((self, other))
+        return NotImplemented
+
+    def __radd__(self, other: str) -> "Rope":
+        if isinstance(other, str):
+            return Rope((other, self))
+        return NotImplemented
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, (str, Rope)):
+            return len(other) == self._length and str(other) == str(self)
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash(str(self))
+
+    def __getitem__(self, key: Union[int, slice]) -> str:
+        if self._flat is not None:
+            return self._flat[key]
+        if isinstance(key, int):
+            index = key + self._length if key < 0 else key
+            if not 0 <= index < self._length:
+                raise IndexError("Rope index out of range")
+            key = slice(index, index + 1)
+
+        start, stop, step = key.indices(self._length)
+        if step != 1:
+            return str(self)[key]
+
+        # Only touch the chunks that overlap the slice
+        pieces = []
+        offset = 0
+        for chunk in self._chunks:
+            end = offset + len(chunk)
+            if end > start and offset < stop:
+                pieces.append(chunk[max(start - offset, 0):stop - offset])
+            if end >= stop:
+                break
+            offset = end
+        return "".join(pieces)
+
+
+@dataclass(slots=True)
 class AgentTask:
     """Represents a task for the agent"""
     task_id: str
@@ -90,9 +391,25 @@ class AgentTask:
     thinking_mode: ThinkingMode = ThinkingMode.NORMAL
     max_iterations: int = 5
     require_verification: bool = True
+    timeout_seconds: Optional[float] = None
+    cancel_token: Optional[CancellationToken] = None
 
 
-@dataclass
+# Binary layout: magic, version, success, iterations, tokens_used,
+# cost_estimate, output kind, then length-prefixed UTF-8 fields
+_RESULT_HEADER = struct.Struct("<2sB?IQdB")
+_RESULT_MAGIC = b"AR"
+_RESULT_VERSION = 1
+_OUTPUT_NONE, _OUTPUT_TEXT, _OUTPUT_JSON = 0, 1, 2
+_LENGTH = struct.Struct("<I")
+_NO_ERROR = 0xFFFFFFFF
+
+
+def _intern_keys(pairs: List[Tuple[str, Any]]) -> Dict[str, Any]:
+    return {sys.intern(key): value for key, value in pairs}
+
+
+@dataclass(slots=True)
 class AgentResult:
     """Result from agent execution"""
     task_id: str
@@ -104,6 +421,476 @@ class AgentResult:
     error: Optional[str] = None
     metadata: Dict[str, Any] = field(default_factory=dict)
 
+    def to_bytes(self) -> bytes:
+        """
+        Serialize to a compact binary form for storage or transport.
+
+        Output and metadata must be JSON-compatible; anything else raises
+        TypeError. The round trip follows JSON semantics: tuples come back
+        as lists and a Rope output comes back as a `str`.
+        """
+        if self.output is None:
+            kind, output = _OUTPUT_NONE, b""
+        elif isinstance(self.output, (str, Rope)):
+            kind = _OUTPUT_TEXT
+            output = b"".join(self.output.iter_bytes()) if isinstance(self.output, Rope) \
+                else self.output.encode("utf-8")
+        else:
+            kind = _OUTPUT_JSON
+            output = json.dumps(self.output, separators=(",", ":")).encode("utf-8")
+
+        task_id = self.task_id.encode("utf-8")
+        error = self.error.encode("utf-8") if self.error is not None else None
+        metadata = json.dumps(self.metadata, separators=(",", ":")).encode("utf-8")
+
+        parts = [
+            _RESULT_HEADER.pack(
+                _RESULT_MAGIC, _RESULT_VERSION, self.success, self.iterations,
+                self.tokens_used, self.cost_estimate, kind
+            ),
+            _LENGTH.pack(len(task_id)), task_id,
+            _LENGTH.pack(_NO_ERROR if error is None else len(error)), error or b"",
+            _LENGTH.pack(len(output)), output,
+            _LENGTH.pack(len(metadata)), metadata,
+        ]
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data: Union[bytes, memoryview]) -> "AgentResult":
+        """
+        Inverse of `to_bytes`; metadata keys are interned.
+
+        Raises ValueError if `data` is not a complete serialized result.
+        """
+        view = memoryview(data)
+        if len(view) < _RESULT_HEADER.size:
+            raise ValueError("Truncated AgentResult: incomplete header")
+        magic, version, success, iterations, tokens, cost, kind = \
+            _RESULT_HEADER.unpack_from(view)
+        if magic != _RESULT_MAGIC or version != _RESULT_VERSION:
+            raise ValueError("Not a serialized AgentResult")
+        if kind not in (_OUTPUT_NONE, _OUTPUT_TEXT, _OUTPUT_JSON):
+            raise ValueError(f"Unknown AgentResult output kind: {kind}")
+
+        offset = _RESULT_HEADER.size
+        fields: List[Optional[str]] = []
+        for _ in range(4):
+            if offset + _LENGTH.size > len(view):
+                raise ValueError("Truncated AgentResult: missing field length")
+            (length,) = _LENGTH.unpack_from(view, offset)
+            offset += _LENGTH.size
+            if length == _NO_ERROR:
+                fields.append(None)
+                continue
+            if offset + length > len(view):
+                raise ValueError("Truncated AgentResult: field data cut short")
+            fields.append(str(view[offset:offset + length], "utf-8"))
+            offset += length
+
+        task_id, error, output, metadata = fields
+        if kind == _OUTPUT_NONE:
+            output = None
+        elif kind == _OUTPUT_JSON:
+            output = json.loads(output)
+
+        return cls(
+            task_id=task_id,
+            success=success,
+            output=output,
+            iterations=iterations,
+            tokens_used=tokens,
+            cost_estimate=cost,
+            error=error,
+            metadata=json.loads(metadata, object_pairs_hook=_intern_keys)
+        )
+
+    def freeze(self) -> "FrozenAgentResult":
+        """Immutable copy, for results that are stored rather than updated"""
+        return FrozenAgentResult(
+            task_id=self.task_id,
+            success=self.success,
+            output=self.output,
+            iterations=self.iterations,
+            tokens_used=self.tokens_used,
+            cost_estimate=self.cost_estimate,
+            error=self.error,
+            metadata=MappingProxyType(dict(self.metadata))
+        )
+
+
+@dataclass(slots=True, frozen=True)
+class FrozenAgentResult:
+    """
+    Read-only form of AgentResult.
+
+    Fields can't be reassigned and `metadata` is a read-only mapping.
+    Use `thaw()` to get a mutable AgentResult back.
+    """
+    task_id: str
+    success: bool
+    output: Any
+    iterations: int
+    tokens_used: int
+    cost_estimate: float
+    error: Optional[str] = None
+    metadata: Mapping[str, Any] = field(default_factory=lambda: MappingProxyType({}))
+
+    def thaw(self) -> AgentResult:
+        """Mutable copy of this result"""
+        return AgentResult(
+            task_id=self.task_id,
+            success=self.success,
+            output=self.output,
+            iterations=self.iterations,
+            tokens_used=self.tokens_used,
+            cost_estimate=self.cost_estimate,
+            error=self.error,
+            metadata=dict(self.metadata)
+        )
+
+    def to_bytes(self) -> bytes:
+        """Same format as `AgentResult.to_bytes`"""
+        return self.thaw().to_bytes()
+
+    @classmethod
+    def from_bytes(cls, data: Union[bytes, memoryview]) -> "FrozenAgentResult":
+        return AgentResult.from_bytes(data).freeze()
+
+
+class _InFlight:
+    """A subtask execution that concurrent identical subtasks wait on"""
+
+    # How often a waiting follower rechecks its own cancellation token
+    POLL_INTERVAL = 0.05
+
+    def __init__(self):
+        self.owner = threading.get_ident()
+        self.done = threading.Event()
+        self.result: Optional[AgentResult] = None
+        self.error: Optional[BaseException] = None
+
+    def wait(self, token: CancellationToken) -> Optional[AgentResult]:
+        """Block until the leader finishes; None if `token` is cancelled first"""
+        while not token.cancelled:
+            remaining = token.remaining()
+            timeout = self.POLL_INTERVAL if remaining is None else min(remaining, self.POLL_INTERVAL)
+            if self.done.wait(timeout):
+                if self.error is not None:
+                    # A fresh exception per follower: threads must not share
+                    # (and mutate the traceback of) the leader's instance
+                    raise SubtaskFailedError(
+                        f"Shared subtask execution failed: {self.error!r}"
+                    ) from self.error
+                return self.result
+        return None
+
+
+def _with_deadline(task: AgentTask) -> AgentTask:
+    """
+    Return the task with a cancellation token enforcing its own
+    `timeout_seconds`, for callers that didn't supply one.
+    """
+    if task.cancel_token is not None or task.timeout_seconds is None:
+        return task
+    return replace(task, cancel_token=CancellationToken(timeout=task.timeout_seconds))
+
+
+def _cancelled_result(task_id: str, token: CancellationToken) -> AgentResult:
+    """Build the failed result reported for a cancelled task"""
+    try:
+        token.raise_if_cancelled()
+        error = "cancelled"
+    except TaskCancelledError as e:
+        error = str(e)
+
+    logger.warning(f"Task {task_id} not completed: {error}")
+    return AgentResult(
+        task_id=task_id,
+        success=False,
+        output=None,
+        iterations=0,
+        tokens_used=0,
+        cost_estimate=0.0,
+        error=error,
+        metadata={"cancelled": True}
+    )
+
+
+def _percentile_rank(count: int, percentile: float) -> int:
+    """Index of the `percentile` value among `count` sorted samples"""
+    return min(count - 1, int(round(percentile / 100 * (count - 1))))
+
+
+class RunStore:
+    """
+    Append-only SQLite store of agent results for later analysis.
+
+    `record` only enqueues a snapshot of the result; a background thread
+    opens the database and writes queued records in batched transactions,
+    so recording never blocks or raises in the caller. Records that can't
+    be stored (queue full, store closed, database errors) are logged and
+    counted in `dropped` instead.
+
+    The database runs in WAL mode, so queries can be made from any
+    thread while the writer is appending. `path` must be a file (each
+    thread opens its own connection).
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS runs (
+            run_id TEXT PRIMARY KEY,
+            recorded_at REAL NOT NULL,
+            task_id TEXT NOT NULL,
+            parent_task_id TEXT,
+            description TEXT,
+            worker TEXT,
+            model TEXT,
+            success INTEGER NOT NULL,
+            iterations INTEGER NOT NULL,
+            tokens_used INTEGER NOT NULL,
+            cost_estimate REAL NOT NULL,
+            latency_ms REAL,
+            error TEXT,
+            quality_score REAL,
+            iterations_to_quality INTEGER,
+            metadata TEXT
+        );
+        CREATE TABLE IF NOT EXISTS run_criteria (
+            run_id TEXT NOT NULL REFERENCES runs(run_id),
+            criterion TEXT NOT NULL,
+            met INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS runs_by_time ON runs(recorded_at);
+        CREATE INDEX IF NOT EXISTS runs_by_worker_time ON runs(worker, recorded_at, latency_ms);
+        CREATE INDEX IF NOT EXISTS runs_by_worker_latency ON runs(worker, latency_ms, recorded_at);
+        CREATE INDEX IF NOT EXISTS runs_by_task ON runs(task_id);
+        CREATE INDEX IF NOT EXISTS criteria_by_criterion ON run_criteria(criterion, run_id);
+    """
+
+    def __init__(
+        self,
+        path: str = "agent_runs.db",
+        batch_size: int = 200,
+        flush_interval: float = 0.5,
+        max_queue: int = 10000
+    ):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._dropped = 0
+        self._dropped_lock = threading.Lock()
+        self._queue: "queue.Queue[Optional[Tuple]]" = queue.Queue(maxsize=max_queue)
+        self._closed = False
+        self._close_lock = threading.Lock()
+        self._opened = threading.Event()
+        # The writer does all database I/O, including creating the schema
+        self._writer = threading.Thread(
+            target=self._write_loop, name="run-store-writer", daemon=True
+        )
+        self._writer.start()
+
+    @property
+    def dropped(self) -> int:
+        """Records that were discarded instead of written"""
+        with self._dropped_lock:
+            return self._dropped
+
+    def record(
+        self,
+        result: AgentResult,
+        description: Optional[str] = None,
+        worker: Optional[str] = None,
+        model: Optional[str] = None,
+        latency_seconds: Optional[float] = None,
+        parent_task_id: Optional[str] = None
+    ) -> None:
+        """Queue a result for writing; never blocks or raises"""
+        if self._closed:
+            self._drop(1, "store closed", result.task_id)
+            return
+
+        try:
+            # Snapshot now: callers may keep mutating the result's metadata
+            entry = (
+                time.time(), result.task_id, parent_task_id, description,
+                worker, model, result.success, result.iterations, result.tokens_used,
+                result.cost_estimate, latency_seconds, result.error, dict(result.metadata)
+            )
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self._drop(1, "queue full", result.task_id)
+        except Exception:
+            logger.exception("Run store could not queue result %s", result.task_id)
+            self._drop(1, "unrecordable", result.task_id)
+
+    def flush(self) -> None:
+        """Block until the schema exists and everything recorded so far is written"""
+        self._opened.wait()
+        self._queue.join()
+
+    def close(self) -> None:
+        """Write outstanding records and stop the writer thread"""
+        with self._close_lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._queue.put(None)
+        self._writer.join()
+
+    def __enter__(self) -> "RunStore":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def query(self, sql: str, params: Iterable[Any] = ()) -> List[Tuple]:
+        """Run a read-only query against the store"""
+        import sqlite3
+
+        connection = sqlite3.connect(self.path)
+        try:
+            return connection.execute(sql, tuple(params)).fetchall()
+        finally:
+            connection.close()
+
+    def latency_percentiles(
+        self,
+        percentile: float = 99,
+        since_seconds: Optional[float] = 86400
+    ) -> Dict[str, float]:
+        """
+        Latency percentile in milliseconds per worker, e.g. p99 over the
+        last day. Each worker's value is picked by an indexed OFFSET scan,
+        so only the index is read rather than every run in the window.
+        """
+        since = self._since(since_seconds)
+        # Loose index scan: jump from worker to worker instead of reading
+        # every row, then count and rank each worker through the indexes
+        workers = self.query(
+            "WITH RECURSIVE w(worker) AS ("
+            "  SELECT MIN(worker) FROM runs"
+            "  UNION ALL"
+            "  SELECT (SELECT MIN(worker) FROM runs WHERE worker > w.worker)"
+            "  FROM w WHERE w.worker IS NOT NULL"
+            ") SELECT worker FROM w WHERE worker IS NOT NULL"
+        )
+
+        percentiles = {}
+        for (worker,) in workers:
+            ((count,),) = self.query(
+                "SELECT COUNT(latency_ms) FROM runs INDEXED BY runs_by_worker_time "
+                "WHERE worker = ? AND recorded_at >= ?",
+                (worker, since)
+            )
+            if not count:
+                continue
+            rows = self.query(
+                "SELECT latency_ms FROM runs INDEXED BY runs_by_worker_latency "
+                "WHERE worker = ? AND latency_ms IS NOT NULL AND recorded_at >= ? "
+                "ORDER BY latency_ms LIMIT 1 OFFSET ?",
+                (worker, since, _percentile_rank(count, percentile))
+            )
+            if rows:
+                percentiles[worker] = rows[0][0]
+        return percentiles
+
+    def iterations_to_quality(self, since_seconds: Optional[float] = None) -> Dict[str, float]:
+        """Average iterations needed to reach the quality threshold, per criterion"""
+        rows = self.query(
+            "SELECT c.criterion, AVG(r.iterations_to_quality) FROM run_criteria c "
+            "JOIN runs r ON r.run_id = c.run_id "
+            "WHERE r.iterations_to_quality IS NOT NULL AND r.recorded_at >= ? "
+            "GROUP BY c.criterion",
+            (self._since(since_seconds),)
+        )
+        return dict(rows)
+
+    @staticmethod
+    def _since(since_seconds: Optional[float]) -> float:
+        return 0.0 if since_seconds is None else time.time() - since_seconds
+
+    def _drop(self, count: int, reason: str, task_id: Optional[str] = None) -> None:
+        with self._dropped_lock:
+            self._dropped += count
+        logger.debug("Run store dropped %d record(s) (%s): %s", count, reason, task_id)
+
+    def _open(self):
+        import sqlite3
+
+        connection = sqlite3.connect(self.path)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.executescript(self.SCHEMA)
+        return connection
+
+    def _write_loop(self) -> None:
+        try:
+            connection = self._open()
+        except Exception:
+            logger.exception("Run store could not open %s; results will be dropped", self.path)
+            connection = None
+        finally:
+            self._opened.set()
+
+        stopping = False
+        try:
+            while not stopping:
+                try:
+                    batch = [self._queue.get(timeout=self.flush_interval)]
+                except queue.Empty:
+                    continue
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+
+                if None in batch:
+                    stopping = True
+                entries = [entry for entry in batch if entry is not None]
+                try:
+                    if connection is None:
+                        self._drop(len(entries), "database unavailable")
+                    elif entries:
+                        self._write_batch(connection, entries)
+                except Exception:
+                    logger.exception("Run store failed to write %d records", len(entries))
+                    self._drop(len(entries), "write failed")
+                finally:
+                    for _ in batch:
+                        self._queue.task_done()
+        finally:
+            if connection is not None:
+                connection.close()
+
+    @staticmethod
+    def _write_batch(connection, entries: List[Tuple]) -> None:
+        import uuid
+
+        runs = []
+        criteria = []
+        for (recorded_at, task_id, parent_task_id, description, worker, model, success,
+             iterations, tokens_used, cost_estimate, latency, error, metadata) in entries:
+            run_id = uuid.uuid4().hex
+            evaluation = metadata.get("evaluation") or {}
+            runs.append((
+                run_id, recorded_at, task_id, parent_task_id, description, worker, model,
+                int(success), iterations, tokens_used, cost_estimate,
+                latency * 1000 if latency is not None else None, error,
+                evaluation.get("score"), metadata.get("iterations_to_quality"),
+                json.dumps(metadata, default=str)
+            ))
+            criteria.extend(
+                (run_id, criterion, int(bool(met)))
+                for criterion, met in evaluation.get("criteria_met", {}).items()
+            )
+
+        with connection:
+            connection.executemany(
+                "INSERT INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", runs
+            )
+            connection.executemany("INSERT INTO run_criteria VALUES (?, ?, ?)", criteria)
+
 
 class ClaudeAgent:
     """
@@ -118,19 +905,42 @@ class ClaudeAgent:
         model: str = "claude-sonnet-4-5",
         api_key: Optional[str] = None,
         system_prompt: Optional[str] = None,
-        max_tokens: int = 4096
+        max_tokens: int = 4096,
+        backend_factory: Callable[[Optional[str]], Any] = create_anthropic_backend
     ):
         self.model = model
         self.api_key = api_key
         self.system_prompt = system_prompt
         self.max_tokens = max_tokens
+        self.backend_factory = backend_factory
         self.conversation_history: List[Dict] = []
         self.tools: Dict[str, Tool] = {}
+        # Shared by every result's metadata rather than copied per result
+        self._tool_names: Tuple[str, ...] = ()
+
+    @property
+    def backend(self) -> Any:
+        """
+        API client, created on first use.
+
+        Agents with the same backend factory and API key share one client
+        through the `resources` registry, whatever model they run.
+        """
+        return resources.get(
+            "backend",
+            (self.backend_factory, self.api_key),
+            lambda: self.backend_factory(self.api_key)
+        )
 
     def add_tool(self, tool: Tool) -> None:
         """Register a tool with the agent"""
         self.tools[tool.name] = tool
-        logger.info(f"Registered tool: {tool.name}")
+        self._tool_names = tuple(self.tools)
+        logger.info("Registered tool: %s", tool.name)
+
+    def run_tool(self, name: str, task: AgentTask, **kwargs) -> Any:
+        """Run a registered tool under the task's cancellation token"""
+        return self.tools[name].execute(cancel_token=task.cancel_token, **kwargs)
 
     def clear_context(self) -> None:
         """Clear conversation history to reset context window"""
@@ -197,6 +1007,10 @@ class ClaudeAgent:
         logger.info(f"Executing task: {task.task_id}")
         logger.info(f"Description: {task.description}")
 
+        task = _with_deadline(task)
+        if task.cancel_token is not None and task.cancel_token.cancelled:
+            return _cancelled_result(task.task_id, task.cancel_token)
+
         # Mock implementation
         result = AgentResult(
             task_id=task.task_id,
@@ -207,7 +1021,7 @@ class ClaudeAgent:
             cost_estimate=0.003,
             metadata={
                 "thinking_mode": task.thinking_mode.value,
-                "tools_available": list(self.tools.keys())
+                "tools_available": self._tool_names
             }
         )
 
@@ -221,18 +1035,160 @@ class OrchestratorAgent(ClaudeAgent):
 
     Implements the Orchestrator-Workers pattern recommended by Anthropic
     for complex, dynamic coding tasks.
+
+    Deadlines come from `AgentTask.timeout_seconds` (whole orchestration)
+    and an optional `timeout_seconds` on each planned subtask. With
+    `hedge_requests` enabled, a subtask still running after its worker's
+    p95 latency is duplicated on a backup worker (see `add_backup_worker`)
+    and the first successful result wins. Call `close()`, or use the
+    orchestrator as a context manager, to release its worker threads.
+
+    Identical subtasks (same worker, normalized description and context)
+    running concurrently across orchestrations share a single execution.
+    `results` keeps the most recent `max_results` subtask results.
+
+    With `rope_output`, synthesized output is a `Rope` sharing the worker
+    outputs rather than a newly joined `str`.
+
+    If a `run_store` is given, every subtask result and the final result
+    are recorded to it in the background.
     """
 
-    def __init__(self, **kwargs):
+    def __init__(
+        self,
+        max_results: int = 1000,
+        hedge_requests: bool = False,
+        hedge_min_samples: int = 20,
+        latency_window: int = 200,
+        max_parallel_workers: int = 8,
+        rope_output: bool = False,
+        run_store: Optional[RunStore] = None,
+        **kwargs
+    ):
+        if max_results < 1:
+            raise ValueError(f"max_results must be at least 1, got {max_results}")
+
         super().__init__(**kwargs)
         self.workers: Dict[str, ClaudeAgent] = {}
+        self.backup_workers: Dict[str, List[ClaudeAgent]] = {}
         self.task_queue: List[AgentTask] = []
-        self.results: Dict[str, AgentResult] = {}
+        self.results: "OrderedDict[str, AgentResult]" = OrderedDict()
+        self.max_results = max_results
+        self._results_lock = threading.Lock()
+        self._inflight: Dict[str, _InFlight] = {}
+        self._inflight_lock = threading.Lock()
+        self.hedge_requests = hedge_requests
+        self.hedge_min_samples = hedge_min_samples
+        self.latency_window = latency_window
+        self.max_parallel_workers = max_parallel_workers
+        self.rope_output = rope_output
+        self.run_store = run_store
+        self.latencies: Dict[str, Deque[float]] = {}
+        self._latency_lock = threading.Lock()
+        self._executor: "Optional[ThreadPoolExecutor]" = None
+        self._executor_lock = threading.Lock()
 
     def add_worker(self, name: str, worker: ClaudeAgent) -> None:
         """Register a specialized worker agent"""
         self.workers[name] = worker
-        logger.info(f"Registered worker: {name}")
+        logger.info("Registered worker: %s", name)
+
+    def add_backup_worker(self, name: str, worker: ClaudeAgent) -> None:
+        """Register a worker that hedged requests for `name` may run on"""
+        self.backup_workers.setdefault(name, []).append(worker)
+        logger.info("Registered backup worker for: %s", name)
+
+    def latency_percentile(self, worker_name: str, percentile: float) -> Optional[float]:
+        """Observed latency percentile for a worker, in seconds"""
+        with self._latency_lock:
+            samples = sorted(self.latencies.get(worker_name, ()))
+        if not samples:
+            return None
+        return samples[_percentile_rank(len(samples), percentile)]
+
+    def _record_latency(self, worker_name: str, seconds: float) -> None:
+        with self._latency_lock:
+            window = self.latencies.get(worker_name)
+            if window is None:
+                window = self.latencies[worker_name] = deque(maxlen=self.latency_window)
+            window.append(seconds)
+
+    def _hedge_delay(self, worker_name: str) -> Optional[float]:
+        """
+        Seconds to wait before hedging, or None if hedging does not apply.
+
+        Hedges only run on a distinct backup worker, never a second
+        concurrent call on the same agent instance.
+        """
+        if not self.hedge_requests:
+            return None
+        primary = self.workers.get(worker_name, self)
+        if not any(b is not primary for b in self.backup_workers.get(worker_name, [])):
+            return None
+        with self._latency_lock:
+            samples = len(self.latencies.get(worker_name, ()))
+        if samples < self.hedge_min_samples:
+            return None
+        return self.latency_percentile(worker_name, 95)
+
+    def _store_and_return(self, subtask_id: str, result: AgentResult) -> AgentResult:
+        """Keep a subtask result, evicting the least recently stored"""
+        with self._results_lock:
+            self.results[subtask_id] = result
+            self.results.move_to_end(subtask_id)
+            while len(self.results) > self.max_results:
+                self.results.popitem(last=False)
+        return result
+
+    @staticmethod
+    def _subtask_key(worker_name: str, subtask: Dict[str, Any]) -> str:
+        """Coalescing key: worker, normalized description and context hash"""
+        description = " ".join(subtask["description"].lower().split())
+        try:
+            context = json.dumps(subtask.get("context", {}), sort_keys=True, default=str)
+        except TypeError:
+            # Keys of mixed types can't be sorted; fall back to insertion order
+            context = repr(subtask.get("context", {}))
+        import hashlib
+
+        context_hash = hashlib.sha256(context.encode("utf-8")).hexdigest()
+        return f"{worker_name}\x00{description}\x00{context_hash}"
+
+    def close(self) -> None:
+        """Shut down the thread pool used for bounded and hedged subtasks"""
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def __enter__(self) -> "OrchestratorAgent":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _get_executor(self) -> "ThreadPoolExecutor":
+        with self._executor_lock:
+            if self._executor is None:
+                from concurrent.futures import ThreadPoolExecutor
+
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_parallel_workers,
+                    thread_name_prefix="orchestrator-worker"
+                )
+            return self._executor
+
+    def _run_timed(
+        self,
+        worker_name: str,
+        worker: ClaudeAgent,
+        task: AgentTask
+    ) -> AgentResult:
+        start = time.monotonic()
+        result = worker.execute(task)
+        if result.success:
+            self._record_latency(worker_name, time.monotonic() - start)
+        return result
 
     def plan(self, task: AgentTask) -> List[Dict[str, Any]]:
         """
@@ -242,6 +1198,10 @@ class OrchestratorAgent(ClaudeAgent):
         """
         logger.info(f"Planning task: {task.task_id}")
 
+        # Subtasks work from the parent task, so identical subtasks of
+        # identical tasks can share one execution
+        context = {"parent_task": task.description, "parent_context": task.context}
+
         # In production, this would use Claude to create a dynamic plan
         # Mock plan for demonstration
         plan = [
@@ -249,24 +1209,32 @@ class OrchestratorAgent(ClaudeAgent):
                 "subtask_id": f"{task.task_id}_1",
                 "description": "Analyze requirements",
                 "worker": "analyzer",
+                "context": context,
+                "parent_task_id": task.task_id,
                 "dependencies": []
             },
             {
                 "subtask_id": f"{task.task_id}_2",
                 "description": "Design solution",
                 "worker": "designer",
+                "context": context,
+                "parent_task_id": task.task_id,
                 "dependencies": [f"{task.task_id}_1"]
             },
             {
                 "subtask_id": f"{task.task_id}_3",
                 "description": "Implement code",
                 "worker": "coder",
+                "context": context,
+                "parent_task_id": task.task_id,
                 "dependencies": [f"{task.task_id}_2"]
             },
             {
                 "subtask_id": f"{task.task_id}_4",
                 "description": "Write tests",
                 "worker": "tester",
+                "context": context,
+                "parent_task_id": task.task_id,
                 "dependencies": [f"{task.task_id}_3"]
             }
         ]
@@ -274,23 +1242,190 @@ class OrchestratorAgent(ClaudeAgent):
         logger.info(f"Created plan with {len(plan)} subtasks")
         return plan
 
-    def delegate(self, subtask: Dict[str, Any]) -> AgentResult:
-        """Delegate a subtask to the appropriate worker"""
+    def _record_run(
+        self,
+        subtask: Dict[str, Any],
+        result: AgentResult,
+        latency_seconds: Optional[float]
+    ) -> None:
+        if self.run_store is None:
+            return
+        worker = self.workers.get(subtask["worker"], self)
+        self.run_store.record(
+            result,
+            description=subtask["description"],
+            worker=subtask["worker"],
+            model=worker.model,
+            latency_seconds=latency_seconds,
+            parent_task_id=subtask.get("parent_task_id")
+        )
+
+    def delegate(
+        self,
+        subtask: Dict[str, Any],
+        cancel_token: Optional[CancellationToken] = None
+    ) -> AgentResult:
+        """
+        Delegate a subtask to the appropriate worker.
+
+        The worker runs under a child of `cancel_token`, bounded by the
+        subtask's own `timeout_seconds`. A worker still running at the
+        deadline is cancelled and a failed result is returned in its place.
+
+        If an identical subtask is already in flight, its result is shared
+        instead of running the worker again. The result is recorded to the
+        run store, if one is configured.
+        """
+        start = time.monotonic()
+        result = self._delegate(subtask, cancel_token)
+        self._record_run(subtask, result, time.monotonic() - start)
+        return result
+
+    def _delegate(
+        self,
+        subtask: Dict[str, Any],
+        cancel_token: Optional[CancellationToken]
+    ) -> AgentResult:
+        """Run or coalesce a subtask; see `delegate`"""
         worker_name = subtask["worker"]
+        subtask_id = subtask["subtask_id"]
+        token = (cancel_token or CancellationToken()).child(subtask.get("timeout_seconds"))
+        key = self._subtask_key(worker_name, subtask)
+
+        while True:
+            with self._inflight_lock:
+                flight = self._inflight.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._inflight[key] = _InFlight()
+
+            if leader:
+                break
+
+            if flight.owner == threading.get_ident():
+                # Reentrant call from the leader's own thread: waiting on
+                # ourselves would never return, so run independently
+                return self._store_and_return(
+                    subtask_id, self._run_subtask(worker_name, subtask, token)
+                )
+
+            shared = flight.wait(token)
+            if shared is None:
+                return _cancelled_result(subtask_id, token)
+            if shared.metadata.get("cancelled"):
+                # The leader ran out of time; retry under our own deadline
+                continue
+
+            logger.info(f"Subtask {subtask_id} coalesced with in-flight {shared.task_id}")
+            result = replace(
+                shared,
+                task_id=subtask_id,
+                metadata={**shared.metadata, "coalesced_with": shared.task_id}
+            )
+            return self._store_and_return(subtask_id, result)
 
+        try:
+            result = self._run_subtask(worker_name, subtask, token)
+            flight.result = result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._inflight_lock:
+                del self._inflight[key]
+            flight.done.set()
+
+        return self._store_and_return(subtask_id, result)
+
+    def _run_subtask(
+        self,
+        worker_name: str,
+        subtask: Dict[str, Any],
+        token: CancellationToken
+    ) -> AgentResult:
         if worker_name not in self.workers:
             logger.warning(f"Worker {worker_name} not found, using default")
-            worker = self
+            # Run as a plain agent: orchestrating the subtask again would
+            # plan the same subtasks and recurse forever
+            worker = super()
 
         else:
             worker = self.workers[worker_name]
 
         task = AgentTask(
             task_id=subtask["subtask_id"],
-            description=subtask["description"]
+            description=subtask["description"],
+            context=subtask.get("context", {}),
+            timeout_seconds=subtask.get("timeout_seconds"),
+            cancel_token=token
         )
 
-        return worker.execute(task)
+        if token.deadline is None and self._hedge_delay(worker_name) is None:
+            return self._run_timed(worker_name, worker, task)
+
+        return self._delegate_bounded(worker_name, worker, task)
+
+    def _delegate_bounded(
+        self,
+        worker_name: str,
+        worker: ClaudeAgent,
+        task: AgentTask
+    ) -> AgentResult:
+        """Run a subtask under its deadline, hedging it if it straggles"""
+        from concurrent.futures import FIRST_COMPLETED, wait
+
+        executor = self._get_executor()
+        token = task.cancel_token
+        start = time.monotonic()
+
+        def launch(agent: ClaudeAgent):
+            attempt = replace(task, cancel_token=token.child())
+            future = executor.submit(self._run_timed, worker_name, agent, attempt)
+            attempts[future] = attempt.cancel_token
+            return future
+
+        attempts: Dict[Any, CancellationToken] = {}
+        pending = {launch(worker)}
+        hedge_delay = self._hedge_delay(worker_name)
+        backups = [b for b in self.backup_workers.get(worker_name, []) if b is not worker]
+        last_failure: Optional[AgentResult] = None
+
+        try:
+            while pending:
+                timeout = token.remaining()
+                if hedge_delay is not None:
+                    until_hedge = max(0.0, hedge_delay - (time.monotonic() - start))
+                    timeout = until_hedge if timeout is None else min(timeout, until_hedge)
+
+                done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    result = future.result()
+                    if result.success:
+                        for other in pending:
+                            attempts[other].cancel("lost hedged race")
+                        if len(attempts) > 1:
+                            result.metadata["hedged"] = True
+                        return result
+                    last_failure = result
+
+                if token.cancelled:
+                    break
+
+                if hedge_delay is not None and time.monotonic() - start >= hedge_delay:
+                    logger.info(
+                        f"Subtask {task.task_id} exceeded p95 of {hedge_delay:.3f}s, hedging"
+                    )
+                    pending.add(launch(backups[0]))
+                    hedge_delay = None
+        finally:
+            # Whatever happened, nothing left running should keep working
+            for future in pending:
+                attempts[future].cancel("deadline exceeded")
+
+        if token.cancelled:
+            return _cancelled_result(task.task_id, token)
+        return last_failure
 
     def synthesize(self, results: List[AgentResult]) -> AgentResult:
         """
@@ -301,7 +1436,11 @@ class OrchestratorAgent(ClaudeAgent):
         logger.info(f"Synthesizing {len(results)} worker results")
 
         # Mock synthesis
-        combined_output = "\n\n".join([r.output for r in results if r.success])
+        outputs = [r.output for r in results if r.success]
+        if self.rope_output:
+            combined_output = Rope.join("\n\n", outputs)
+        else:
+            combined_output = "\n\n".join(outputs)
         total_tokens = sum(r.tokens_used for r in results)
         total_cost = sum(r.cost_estimate for r in results)
 
@@ -333,6 +1472,12 @@ class OrchestratorAgent(ClaudeAgent):
         4. Verify: Check quality (if required)
         """
         logger.info(f"Orchestrator executing task: {task.task_id}")
+        start = time.monotonic()
+
+        if task.cancel_token is not None:
+            token = task.cancel_token.child(task.timeout_seconds)
+        else:
+            token = CancellationToken(timeout=task.timeout_seconds)
 
         # Step 1: Plan
         plan = self.plan(task)
@@ -352,7 +1497,12 @@ class OrchestratorAgent(ClaudeAgent):
                 deps_met = all(dep in completed for dep in subtask["dependencies"])
 
                 if deps_met:
-                    result = self.delegate(subtask)
+                    if token.cancelled:
+                        # Don't start downstream work once out of time
+                        result = _cancelled_result(subtask_id, token)
+                        self._record_run(subtask, result, None)
+                    else:
+                        result = self.delegate(subtask, cancel_token=token)
                     results.append(result)
                     completed.add(subtask_id)
 
@@ -366,6 +1516,15 @@ class OrchestratorAgent(ClaudeAgent):
             # In production, use separate evaluator agent
             final_result.metadata["verified"] = True
 
+        if self.run_store is not None:
+            self.run_store.record(
+                final_result,
+                description=task.description,
+                worker="orchestrator",
+                model=self.model,
+                latency_seconds=time.monotonic() - start
+            )
+
         return final_result
 
 
@@ -380,11 +1539,23 @@ class EvaluatorOptimizer:
         self,
         generator: ClaudeAgent,
         evaluator: ClaudeAgent,
-        quality_threshold: float = 0.8
+        quality_threshold: float = 0.8,
+        run_store: Optional[RunStore] = None
     ):
         self.generator = generator
         self.evaluator = evaluator
         self.quality_threshold = quality_threshold
+        self.run_store = run_store
+
+    def _record_run(self, task: AgentTask, result: AgentResult, start: float) -> None:
+        if self.run_store is not None:
+            self.run_store.record(
+                result,
+                description=task.description,
+                worker="generator",
+                model=self.generator.model,
+                latency_seconds=time.monotonic() - start
+            )
 
     def evaluate(self, output: str, criteria: List[str]) -> Dict[str, Any]:
         """
@@ -413,11 +1584,11 @@ class EvaluatorOptimizer:
         for improvement in feedback["feedback"]["improvements"]:
             refined_description += f"- {improvement}\n"
 
-        return AgentTask(
+        # replace() keeps the task's deadline and cancellation token
+        return replace(
+            task,
             task_id=f"{task.task_id}_refined",
-            description=refined_description,
-            context=task.context,
-            thinking_mode=task.thinking_mode
+            description=refined_description
         )
 
     def execute(
@@ -429,11 +1600,21 @@ class EvaluatorOptimizer:
         Execute with iterative refinement until quality threshold met.
         """
         logger.info(f"Starting evaluator-optimizer loop for task: {task.task_id}")
+        start = time.monotonic()
 
         iteration = 0
-        current_task = task
+        if task.cancel_token is not None:
+            token = task.cancel_token.child(task.timeout_seconds)
+        else:
+            token = CancellationToken(timeout=task.timeout_seconds)
+        current_task = replace(task, cancel_token=token)
 
         while iteration < task.max_iterations:
+            if token.cancelled:
+                result = _cancelled_result(current_task.task_id, token)
+                self._record_run(task, result, start)
+                return result
+
             iteration += 1
             logger.info(f"Iteration {iteration}/{task.max_iterations}")
 
@@ -447,6 +1628,7 @@ class EvaluatorOptimizer:
                 logger.info(f"Quality threshold met: {evaluation['score']}")
                 result.metadata["evaluation"] = evaluation
                 result.metadata["iterations_to_quality"] = iteration
+                self._record_run(task, result, start)
                 return result
 
             # Refine and retry
@@ -457,6 +1639,7 @@ class EvaluatorOptimizer:
         logger.warning("Max iterations reached without meeting quality threshold")
         result.metadata["evaluation"] = evaluation
         result.metadata["quality_threshold_met"] = False
+        self._record_run(task, result, start)
 
         return result
 
@@ -745,6 +1928,8 @@ def example_test_driven_development():
 
 
 if __name__ == "__main__":
+    configure_logging()
+
     print("=" * 60)
     print("Claude Coding Agent - Best Practices Implementation")
     print("=" * 60)
@@ -0,0 +1,526 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from claude_agent import (
+    AgentResult,
+    AgentTask,
+    CancellationToken,
+    ClaudeAgent,
+    DeadlineExceededError,
+    EvaluatorOptimizer,
+    FrozenAgentResult,
+    OrchestratorAgent,
+    Rope,
+    RunStore,
+    SubtaskFailedError,
+    TaskCancelledError,
+    Tool,
+    _InFlight,
+    resources,
+)
+
+WORKERS = ["analyzer", "designer", "coder", "tester"]
+
+
+class SlowAgent(ClaudeAgent):
+    """Mock worker that sleeps cooperatively before completing"""
+
+    def __init__(self, delay: float = 0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.delay = delay
+        self.calls = []
+
+    def execute(self, task, tools=None):
+        self.calls.append(task.task_id)
+        end = time.monotonic() + self.delay
+        while time.monotonic() < end:
+            if task.cancel_token is not None and task.cancel_token.cancelled:
+                break
+            time.sleep(0.005)
+        return super().execute(task)
+
+
+@pytest.fixture
+def orchestrator():
+    with OrchestratorAgent() as agent:
+        for name in WORKERS:
+            agent.add_worker(name, SlowAgent())
+        yield agent
+
+
+# Deadlines and cancellation
+
+def test_child_token_inherits_earlier_deadline():
+    parent = CancellationToken(timeout=0.05)
+    child = parent.child(timeout=10)
+    assert child.deadline == parent.deadline
+
+
+def test_parent_cancel_propagates_to_child():
+    parent = CancellationToken()
+    child = parent.child()
+    parent.cancel("stop")
+    assert child.cancelled
+    with pytest.raises(TaskCancelledError, match="stop"):
+        child.raise_if_cancelled()
+
+
+def test_expired_token_raises_deadline_exceeded():
+    token = CancellationToken(timeout=0)
+    with pytest.raises(DeadlineExceededError):
+        token.raise_if_cancelled()
+
+
+def test_tool_refuses_cancelled_token_and_clamps_timeout():
+    tool = Tool(
+        name="run",
+        description="",
+        parameters={"timeout_seconds": {"type": "integer", "default": 30}},
+        function=lambda **kwargs: kwargs,
+    )
+    token = CancellationToken(timeout=5)
+    assert tool.execute(cancel_token=token)["timeout_seconds"] <= 5
+
+    token.cancel()
+    with pytest.raises(TaskCancelledError):
+        tool.execute(cancel_token=token)
+
+
+def test_orchestration_deadline_skips_downstream_subtasks(orchestrator):
+    orchestrator.workers["designer"] = SlowAgent(delay=1.0)
+
+    start = time.monotonic()
+    result = orchestrator.execute(AgentTask("t", "x", timeout_seconds=0.1))
+
+    assert time.monotonic() - start < 0.5
+    assert not result.success
+    assert orchestrator.workers["coder"].calls == []
+
+
+def test_subtask_timeout_cancels_slow_worker(orchestrator):
+    slow = SlowAgent(delay=1.0)
+    orchestrator.workers["analyzer"] = slow
+    subtask = {
+        "subtask_id": "s", "description": "d", "worker": "analyzer", "timeout_seconds": 0.05
+    }
+
+    result = orchestrator.delegate(subtask)
+
+    assert not result.success
+    assert result.metadata["cancelled"]
+
+
+def test_tool_timeout_respects_declared_type_and_minimum():
+    tool = Tool(
+        name="run",
+        description="",
+        parameters={"timeout_seconds": {"type": "integer", "default": 30, "minimum": 1}},
+        function=lambda **kwargs: kwargs,
+    )
+    assert tool.execute(cancel_token=CancellationToken(timeout=2.5))["timeout_seconds"] == 2
+
+    with pytest.raises(DeadlineExceededError):
+        tool.execute(cancel_token=CancellationToken(timeout=0.3))
+
+
+def test_worker_enforces_its_own_timeout_when_called_directly():
+    result = ClaudeAgent().execute(AgentTask("t", "x", timeout_seconds=0))
+    assert not result.success
+    assert result.error == "Deadline exceeded"
+
+
+def test_evaluator_optimizer_carries_token_and_stops_when_cancelled():
+    generator = SlowAgent()
+    seen = []
+    original = generator.execute
+    generator.execute = lambda task, tools=None: seen.append(task.cancel_token) or original(task)
+    optimizer = EvaluatorOptimizer(generator, ClaudeAgent(), quality_threshold=1.0)
+
+    optimizer.execute(AgentTask("t", "x", max_iterations=3), ["c"])
+    assert len(seen) == 3 and all(token is not None for token in seen)
+
+    token = CancellationToken()
+    token.cancel()
+    seen.clear()
+    result = optimizer.execute(AgentTask("t", "x", max_iterations=3, cancel_token=token), ["c"])
+    assert not result.success
+    assert seen == []
+
+
+# Hedging
+
+def test_hedge_runs_on_backup_and_first_success_wins():
+    with OrchestratorAgent(hedge_requests=True, hedge_min_samples=1) as agent:
+        agent.add_worker("analyzer", SlowAgent(delay=1.0))
+        backup = SlowAgent()
+        agent.add_backup_worker("analyzer", backup)
+        agent.latencies["analyzer"] = [0.01]
+
+        start = time.monotonic()
+        result = agent.delegate({"subtask_id": "s", "description": "d", "worker": "analyzer"})
+
+        assert time.monotonic() - start < 0.5
+        assert result.success
+        assert result.metadata["hedged"]
+        assert backup.calls == ["s"]
+
+
+def test_no_hedge_without_distinct_backup():
+    with OrchestratorAgent(hedge_requests=True, hedge_min_samples=1) as agent:
+        worker = SlowAgent()
+        agent.add_worker("analyzer", worker)
+        agent.add_backup_worker("analyzer", worker)
+        agent.latencies["analyzer"] = [0.01]
+        assert agent._hedge_delay("analyzer") is None
+
+
+def test_close_shuts_down_executor(orchestrator):
+    executor = orchestrator._get_executor()
+    orchestrator.close()
+    assert orchestrator._executor is None
+    assert executor._shutdown
+
+
+# Subtask coalescing and result storage
+
+def test_concurrent_identical_orchestrations_share_subtasks():
+    with OrchestratorAgent() as agent:
+        workers = {name: SlowAgent(delay=0.1) for name in WORKERS}
+        for name, worker in workers.items():
+            agent.add_worker(name, worker)
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda i=i: results.append(agent.execute(AgentTask(f"t{i}", "same"))))
+            for i in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert all(r.success for r in results)
+        assert sum(len(w.calls) for w in workers.values()) == len(WORKERS)
+
+
+def test_different_context_is_not_coalesced(orchestrator):
+    subtask = {"subtask_id": "a", "description": "Analyze", "worker": "analyzer"}
+    assert orchestrator._subtask_key("analyzer", {**subtask, "context": {"x": 1}}) != \
+        orchestrator._subtask_key("analyzer", {**subtask, "context": {"x": 2}})
+
+
+def test_task_context_cannot_override_parent_task(orchestrator):
+    plan = orchestrator.plan(AgentTask("t", "real", context={"parent_task": "other"}))
+    assert plan[0]["context"]["parent_task"] == "real"
+
+
+def test_mixed_type_context_keys_do_not_crash(orchestrator):
+    result = orchestrator.execute(AgentTask("x", "y", context={1: "a", "b": 2}))
+    assert result.success
+
+
+def test_missing_worker_falls_back_without_recursing():
+    outcome = []
+
+    def run():
+        with OrchestratorAgent() as agent:
+            agent.add_worker("analyzer", SlowAgent())
+            outcome.append(agent.execute(AgentTask("t", "x")))
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout=30)
+    assert not thread.is_alive()
+    assert outcome[0].success
+    assert outcome[0].output.endswith("Completed: Write tests")
+
+
+def test_followers_get_distinct_exceptions_chained_to_leader():
+    flight = _InFlight()
+    flight.error = RuntimeError("boom")
+    flight.done.set()
+
+    errors = []
+    for _ in range(2):
+        with pytest.raises(SubtaskFailedError) as info:
+            flight.wait(CancellationToken())
+        errors.append(info.value)
+
+    assert errors[0] is not errors[1]
+    assert all(error.__cause__ is flight.error for error in errors)
+
+
+def test_same_thread_leader_runs_independently(orchestrator):
+    subtask = {"subtask_id": "s", "description": "d", "worker": "analyzer"}
+    key = orchestrator._subtask_key("analyzer", subtask)
+    orchestrator._inflight[key] = _InFlight()
+
+    assert orchestrator.delegate(subtask).success
+
+
+def test_cancelled_follower_stops_waiting(orchestrator):
+    subtask = {"subtask_id": "s", "description": "d", "worker": "analyzer"}
+    key = orchestrator._subtask_key("analyzer", subtask)
+    flight = _InFlight()
+    flight.owner = None
+    orchestrator._inflight[key] = flight
+
+    token = CancellationToken()
+    threading.Timer(0.05, token.cancel).start()
+    start = time.monotonic()
+    result = orchestrator.delegate(subtask, cancel_token=token)
+
+    assert time.monotonic() - start < 1
+    assert result.metadata["cancelled"]
+
+
+def test_results_are_evicted_least_recent_first():
+    with OrchestratorAgent(max_results=2) as agent:
+        for name in WORKERS:
+            agent.add_worker(name, SlowAgent())
+        agent.execute(AgentTask("t", "x"))
+        assert list(agent.results) == ["t_3", "t_4"]
+
+
+def test_max_results_must_be_positive():
+    with pytest.raises(ValueError):
+        OrchestratorAgent(max_results=0)
+
+
+# Compact representations
+
+def test_synthesized_output_is_str_by_default(orchestrator):
+    result = orchestrator.execute(AgentTask("t", "x"))
+    assert isinstance(result.output, str)
+    json.dumps({"out": result.output})
+
+
+def test_rope_output_is_opt_in():
+    with OrchestratorAgent(rope_output=True) as agent:
+        for name in WORKERS:
+            agent.add_worker(name, SlowAgent())
+        result = agent.execute(AgentTask("t", "x"))
+        assert isinstance(result.output, Rope)
+        assert str(result.output).startswith("Completed: Analyze requirements\n\n")
+
+
+def test_rope_join_matches_str_join_and_slices_lazily():
+    parts = ["alpha", "beta", "gamma"]
+    rope = Rope.join(", ", parts)
+    text = ", ".join(parts)
+
+    assert rope == text
+    assert len(rope) == len(text)
+    assert rope[3:9] == text[3:9]
+    assert rope[-1] == text[-1]
+    assert (rope + "!") == text + "!"
+
+
+def test_rope_join_matches_str_join_with_empty_parts():
+    parts = ["x", "", "y"]
+    assert str(Rope.join("\n\n", parts)) == "\n\n".join(parts)
+
+
+def test_synthesize_keeps_empty_outputs_like_str_join(orchestrator):
+    results = [AgentResult(str(i), True, text, 1, 1, 0.0) for i, text in enumerate(["A", "", "I"])]
+    assert orchestrator.synthesize(results).output == "A\n\n\n\nI"
+
+
+def test_rope_rejects_non_str_chunks():
+    with pytest.raises(TypeError):
+        Rope.join("\n\n", ["x", None])
+    with pytest.raises(TypeError):
+        Rope([{"a": 1}])
+
+
+def test_rope_iter_bytes_reuses_encoded_chunks():
+    rope = Rope(["h\u00e9", "llo"])
+    first = [bytes(view) for view in rope.iter_bytes()]
+    assert b"".join(first) == "h\u00e9llo".encode("utf-8")
+    assert all(a.obj is b.obj for a, b in zip(rope.iter_bytes(), rope.iter_bytes()))
+
+
+def test_agent_result_binary_round_trip():
+    result = AgentResult(
+        task_id="t",
+        success=False,
+        output={"files": ["a.py"]},
+        iterations=2,
+        tokens_used=1234,
+        cost_estimate=0.5,
+        error="boom",
+        metadata={"tools_available": ["search"]},
+    )
+    assert AgentResult.from_bytes(result.to_bytes()) == result
+
+
+@pytest.mark.parametrize("mutate", [
+    lambda data: data[:5],
+    lambda data: data[:-3],
+    lambda data: data[:24] + bytes([9]) + data[25:],  # unknown output kind
+])
+def test_agent_result_from_bytes_rejects_malformed_input(mutate):
+    data = AgentResult("t", True, "out", 1, 1, 0.0).to_bytes()
+    with pytest.raises(ValueError):
+        AgentResult.from_bytes(mutate(data))
+
+
+def test_frozen_agent_result_round_trip():
+    result = AgentResult("t", True, "out", 1, 1, 0.0, metadata={"k": [1]})
+    frozen = result.freeze()
+
+    with pytest.raises(AttributeError):
+        frozen.success = False
+    with pytest.raises(TypeError):
+        frozen.metadata["k"] = 2
+    assert frozen.thaw() == result
+    assert FrozenAgentResult.from_bytes(frozen.to_bytes()) == frozen
+
+
+def test_agent_result_rejects_unserializable_values():
+    result = AgentResult("t", True, object(), 1, 1, 0.0)
+    with pytest.raises(TypeError):
+        result.to_bytes()
+
+
+def test_agent_task_is_slotted_and_mutable():
+    task = AgentTask("t", "x")
+    task.description = "y"
+    assert not hasattr(task, "__dict__")
+
+
+# Lazy initialization
+
+def test_import_does_not_configure_logging_or_heavy_modules():
+    probe = (
+        "import logging, sys; import claude_agent; "
+        "print(len(logging.getLogger().handlers), "
+        "'concurrent.futures' in sys.modules, 'hashlib' in sys.modules)"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", probe],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        capture_output=True,
+        text=True,
+        check=True
+    ).stdout.split()
+    assert output == ["0", "False", "False"]
+
+
+def test_backend_is_created_on_first_use_and_shared():
+    created = []
+
+    def factory(api_key):
+        created.append(api_key)
+        return object()
+
+    try:
+        workers = [
+            ClaudeAgent(model=model, api_key="k", backend_factory=factory)
+            for model in ("claude-sonnet-4-5", "claude-haiku-4-5")
+        ]
+        assert created == []
+
+        assert workers[0].backend is workers[1].backend
+        assert created == ["k"]
+    finally:
+        resources.clear("backend")
+
+
+# Run store
+
+@pytest.fixture
+def run_store(tmp_path):
+    with RunStore(path=str(tmp_path / "runs.db"), flush_interval=0.01) as store:
+        yield store
+
+
+def test_orchestration_results_are_recorded(run_store):
+    with OrchestratorAgent(run_store=run_store) as agent:
+        for name in WORKERS:
+            agent.add_worker(name, SlowAgent())
+        agent.execute(AgentTask("t", "x"))
+    run_store.flush()
+
+    rows = run_store.query("SELECT task_id, parent_task_id, worker FROM runs ORDER BY task_id")
+    assert rows == [
+        ("t", None, "orchestrator"),
+        ("t_1", "t", "analyzer"),
+        ("t_2", "t", "designer"),
+        ("t_3", "t", "coder"),
+        ("t_4", "t", "tester"),
+    ]
+    assert set(run_store.latency_percentiles(99)) == set(WORKERS) | {"orchestrator"}
+
+
+def test_iterations_to_quality_per_criterion(run_store):
+    optimizer = EvaluatorOptimizer(ClaudeAgent(), ClaudeAgent(), run_store=run_store)
+    optimizer.execute(AgentTask("t", "x"), ["secure", "fast"])
+    run_store.flush()
+
+    assert run_store.iterations_to_quality() == {"secure": 1.0, "fast": 1.0}
+
+
+def test_record_does_not_block_when_queue_is_full(tmp_path):
+    release = threading.Event()
+    store = RunStore(path=str(tmp_path / "runs.db"), max_queue=1)
+    store._write_batch = lambda connection, entries: release.wait()
+    store.flush()
+
+    result = AgentResult("t", True, "out", 1, 1, 0.0)
+    store.record(result)  # taken by the (blocked) writer
+    while store._queue.qsize():
+        time.sleep(0.001)
+    store.record(result)  # fills the queue
+    store.record(result)  # dropped
+
+    assert store.dropped == 1
+    release.set()
+    store.close()
+
+
+def test_record_never_raises_on_unusable_database(tmp_path):
+    store = RunStore(path=str(tmp_path / "missing" / "runs.db"))
+    with OrchestratorAgent(run_store=store) as agent:
+        for name in WORKERS:
+            agent.add_worker(name, SlowAgent())
+        assert agent.execute(AgentTask("t", "x")).success
+
+    store.flush()
+    assert store.dropped == 5
+    store.close()
+
+
+def test_record_after_close_is_dropped(run_store):
+    run_store.close()
+    run_store.record(AgentResult("t", True, "out", 1, 1, 0.0))
+    assert run_store.dropped == 1
+
+
+def test_latency_percentiles_per_worker(run_store):
+    for i in range(100):
+        run_store.record(
+            AgentResult(str(i), True, "out", 1, 1, 0.0),
+            worker="fast" if i % 2 else "slow",
+            latency_seconds=i / 1000 if i % 2 else 1 + i / 1000,
+        )
+    run_store.flush()
+
+    p50 = run_store.latency_percentiles(50)
+    assert p50["fast"] == pytest.approx(49.0)
+    assert p50["slow"] == pytest.approx(1048.0)
+
+
+def test_recorded_metadata_is_snapshotted(run_store):
+    result = AgentResult("t", True, "out", 1, 1, 0.0, metadata={"a": 1})
+    run_store.record(result)
+    result.metadata["a"] = 2
+    run_store.flush()
+
+    assert run_store.query("SELECT metadata FROM runs") == [('{"a": 1}',)]